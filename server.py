@@ -1,13 +1,28 @@
+import gzip
 import json
+import math
 import os
+import queue
+import re
+import selectors
+import signal
+import socket
 import sys
 import threading
 import time
+import bisect
 import hmac
+import itertools
+from collections import deque
 import hashlib
 from http import HTTPStatus
-from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs, unquote, quote
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, unquote, quote
+
+try:
+    import orjson  # optional: faster JSON parsing/serialization if installed
+except ImportError:
+    orjson = None
 
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -18,12 +33,82 @@ DATA_DIR = os.path.join(ROOT, "data")
 # Config
 PORT = int(os.environ.get("PORT", "8000"))
 ASSIGNMENT_TTL_SEC = int(os.environ.get("ASSIGNMENT_TTL", "180"))
+VIDEO_SCAN_TTL_SEC = float(os.environ.get("VIDEO_SCAN_TTL", "2"))
+HTTP_WORKERS = max(1, int(os.environ.get("HTTP_WORKERS", "32")))
+KEEPALIVE_TIMEOUT_SEC = float(os.environ.get("KEEPALIVE_TIMEOUT", "30"))
+VIDEO_SEND_TIMEOUT_SEC = float(os.environ.get("VIDEO_SEND_TIMEOUT", "120"))
 SINGLE_LABEL_PER_VIDEO = os.environ.get("SINGLE_LABEL_PER_VIDEO", "1") not in ("0", "false", "False")
 REVIEWER_PASSWORD = os.environ.get("REVIEWER_PASSWORD", "review")
+REVIEWER_PASSWORD_BYTES = REVIEWER_PASSWORD.encode("utf-8")
 SECRET_PATH = os.path.join(DATA_DIR, "secret.txt")
 VIDEOS_PATH_FILE = os.path.join(DATA_DIR, "videos_path.txt")
 
 VIDEO_EXTS = {".mp4", ".webm", ".m4v", ".mov"}
+OK_JSON = b'{"ok": true}'
+_UNAUTHORIZED_BODY = b'{"error":"unauthorized"}'
+# Complete 401 response, sent with a single write
+UNAUTHORIZED_RESPONSE = (
+    b"HTTP/1.1 401 Unauthorized\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: %d\r\n"
+    b"Connection: close\r\n"
+    b"\r\n%s" % (len(_UNAUTHORIZED_BODY), _UNAUTHORIZED_BODY)
+)
+HAS_SENDFILE = hasattr(os, "sendfile")
+FILE_CHUNK_SIZE = 256 * 1024  # read/write chunk when os.sendfile is unavailable
+WRITE_RETRY_SEC = 1.0  # retry interval for label appends that failed
+
+
+# Runs of 19+ digits may be integers outside 64 bits, which orjson.loads
+# silently turns into floats; such input is parsed with stdlib json instead.
+_LONG_DIGITS = re.compile(r"\d{19}")
+_LONG_DIGITS_B = re.compile(rb"\d{19}")
+
+
+def _json_loads(data):
+    # Accepts str or bytes. Falls back to stdlib json for input orjson rejects
+    # (e.g. NaN) or would change (integers beyond 64 bits).
+    if orjson is not None:
+        long_digits = _LONG_DIGITS_B if isinstance(data, (bytes, bytearray)) else _LONG_DIGITS
+        if not long_digits.search(data):
+            try:
+                return orjson.loads(data)
+            except ValueError:
+                pass
+    return json.loads(data)
+
+
+def _has_nonfinite(obj):
+    # NaN/Infinity only get in via the stdlib fallback above; orjson.dumps
+    # would write them as null.
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_nonfinite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_nonfinite(v) for v in obj)
+    return False
+
+
+def _json_bytes(obj) -> bytes:
+    # JSON for HTTP response bodies, already encoded.
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def _json_line(obj) -> bytes:
+    # One JSONL record as UTF-8 bytes, newline included. Records must
+    # round-trip exactly, so non-finite floats go through stdlib json.
+    if orjson is not None and not _has_nonfinite(obj):
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
 
 
 def ensure_dirs():
@@ -75,62 +160,270 @@ def resolve_videos_dir(argv):
     return chosen
 
 
+def safe_join(base, rel):
+    # Join rel onto base (an absolute, normalized dir); None if the result would
+    # escape base via "..", an absolute rel, or a different drive.
+    full = os.path.normpath(os.path.join(base, rel))
+    try:
+        if os.path.commonpath([base, full]) != base:
+            return None
+    except ValueError:
+        return None
+    return full
+
+
+def _iter_video_files(dirpath, prefix):
+    # Recursive os.scandir walk: DirEntry caches the file type from the
+    # directory read, so no extra stat() per entry as with os.walk.
+    # Like os.walk, symlinked directories are not followed and unreadable
+    # directories are skipped.
+    try:
+        with os.scandir(dirpath) as it:
+            for e in it:
+                name = e.name
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        yield from _iter_video_files(e.path, prefix + name + "/")
+                        continue
+                    dot = name.rfind(".")
+                    if dot < 0 or name[dot:].lower() not in VIDEO_EXTS:
+                        continue
+                    if e.is_file():
+                        yield prefix + name
+                except OSError:
+                    continue
+    except OSError:
+        return
+
+
 class State:
     def __init__(self):
         self.lock = threading.Lock()
-        self.videos = self._scan_videos()
+        self._videos_cached = None  # last scan result
+        self._videos_cache_ts = 0.0  # monotonic time of last scan
+        self._videos_cache_mtime = None  # VIDEOS_DIR mtime at last scan
+        self.videos = []
+        self._video_set = set()
+        self._videos_version = 0  # bumped whenever the scanned video list changes
         self.assigned = {}  # video_id -> {user, ts}
         self.labeled_ids = set()  # unique labeled video ids
+        self.unlabeled = set()  # videos not in labeled_ids, kept up to date incrementally
         self.per_user_counts = {}  # user -> count
         self.labels_path = os.path.join(DATA_DIR, "labels.jsonl")
+        self.deleted_path = os.path.join(DATA_DIR, "labels.deleted.jsonl")
         self.secret = self._load_or_create_secret()
+        # Reviewer cookie value; fixed for the lifetime of the secret
+        self.reviewer_token = hmac.new(self.secret, b"reviewer", hashlib.sha256).hexdigest()
+        self.reviewer_token_bytes = self.reviewer_token.encode("ascii")
         self.active_users = set()
         self.owner_map = {}  # video_id -> owner user (for unlabeled only)
+        self._owner_queues = {}  # user -> deque of owned video ids, in videos order
         self._balance_sig = None  # signature for when to recompute balancing
+        self._participants = []  # sorted balancing participants, as of the last rebalance
         self.last_undo = {}  # user -> list of undone records (most recent batch)
+        self._records = []  # parsed labels.jsonl records in file order; None = removed
+        self._user_index = {}  # user -> positions in _records
+        self._dead_records = 0  # tombstoned entries in _records
+        self._tombstone_count = 0  # lines in labels.deleted.jsonl
+        self._stats_json = None  # encoded /api/stats body; None = needs rebuild
         self._load_existing_labels()
+        self._refresh_videos()
+        # Appends to labels.jsonl happen on a writer thread, off the request path
+        self._write_q = queue.SimpleQueue()
+        self._write_error = None  # set by the writer while appends are failing
+        self._writer = threading.Thread(target=self._writer_loop, name="labels-writer", daemon=True)
+        self._writer.start()
 
     def _scan_videos(self):
-        items = []
+        # Reuse the last scan while VIDEOS_DIR is unchanged and the result is
+        # younger than VIDEO_SCAN_TTL_SEC. The directory mtime only reflects
+        # top-level changes; files added in subfolders show up once the TTL expires.
+        try:
+            mtime = os.stat(VIDEOS_DIR).st_mtime_ns
+        except OSError:
+            mtime = None
+        now = time.monotonic()
+        if (
+            self._videos_cached is not None
+            and mtime == self._videos_cache_mtime
+            and now - self._videos_cache_ts < VIDEO_SCAN_TTL_SEC
+        ):
+            return self._videos_cached
+        videos = self._walk_videos()
+        if videos != self._videos_cached:
+            self._videos_cached = videos
+            self._stats_json = None
+        self._videos_cache_ts = now
+        self._videos_cache_mtime = mtime
+        return self._videos_cached
+
+    def _walk_videos(self):
         if not os.path.isdir(VIDEOS_DIR):
             return []
         # Walk subdirectories and collect files with supported extensions.
-        for root, _dirs, files in os.walk(VIDEOS_DIR):
-            for name in files:
-                ext = os.path.splitext(name)[1].lower()
-                if ext not in VIDEO_EXTS:
-                    continue
-                p = os.path.join(root, name)
-                # Store paths relative to VIDEOS_DIR using forward slashes for consistency.
-                rel = os.path.relpath(p, VIDEOS_DIR)
-                if os.sep != "/":
-                    rel = rel.replace(os.sep, "/")
-                items.append(rel)
+        # Store paths relative to VIDEOS_DIR using forward slashes for consistency.
+        items = list(_iter_video_files(VIDEOS_DIR, ""))
         items.sort()
         return items
 
+    def _load_tombstones(self):
+        # (user, id, ts) -> number of removed records with that key
+        tombstones = {}
+        if not os.path.exists(self.deleted_path):
+            return tombstones
+        try:
+            with open(self.deleted_path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rec = _json_loads(line)
+                    except Exception:
+                        continue
+                    key = (rec.get("user"), rec.get("id"), rec.get("ts"))
+                    tombstones[key] = tombstones.get(key, 0) + 1
+                    self._tombstone_count += 1
+        except Exception:
+            pass
+        return tombstones
+
     def _load_existing_labels(self):
         if not os.path.exists(self.labels_path):
             return
+        tombstones = self._load_tombstones()
         try:
-            with open(self.labels_path, "r", encoding="utf-8") as f:
+            with open(self.labels_path, "rb") as f:
                 for line in f:
                     if not line.strip():
                         continue
                     try:
-                        rec = json.loads(line)
+                        rec = _json_loads(line)
                     except Exception:
                         continue
+                    if tombstones:
+                        key = (rec.get("user"), rec.get("id"), rec.get("ts"))
+                        if tombstones.get(key):
+                            # Removed via /api/unlabel since the last compaction
+                            tombstones[key] -= 1
+                            continue
                     vid = rec.get("id")
                     user = rec.get("user")
                     if vid:
                         self.labeled_ids.add(vid)
                     if user:
                         self.per_user_counts[user] = self.per_user_counts.get(user, 0) + 1
+                    self._index_record(rec)
         except Exception:
             # If labels file corrupted, continue with empty state
             pass
 
+    def _index_record(self, rec):
+        self._records.append(rec)
+        user = rec.get("user")
+        if user:
+            self._user_index.setdefault(user, []).append(len(self._records) - 1)
+
+    def _drop_records(self, positions):
+        # Tombstone records in place; compact once a quarter of the list is dead.
+        for pos in positions:
+            self._records[pos] = None
+        self._dead_records += len(positions)
+        if self._dead_records > len(self._records) // 4:
+            live = [rec for rec in self._records if rec is not None]
+            self._records = []
+            self._user_index = {}
+            self._dead_records = 0
+            for rec in live:
+                self._index_record(rec)
+
+    def _writer_loop(self):
+        # Queue items are JSONL lines (bytes) or flush markers (threading.Event).
+        # Everything queued by the time we wake up goes out in a single write().
+        # Lines whose append fails are kept, in order, and retried every
+        # WRITE_RETRY_SEC until the write succeeds; they were already acknowledged.
+        unwritten = []
+        while True:
+            try:
+                batch = [self._write_q.get(timeout=WRITE_RETRY_SEC if unwritten else None)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._write_q.get_nowait())
+                except queue.Empty:
+                    break
+            lines = unwritten + [item for item in batch if isinstance(item, bytes)]
+            if lines:
+                try:
+                    with open(self.labels_path, "ab") as f:
+                        f.write(b"".join(lines))
+                    unwritten = []
+                    self._write_error = None
+                except Exception as e:
+                    unwritten = lines
+                    if self._write_error is None:
+                        print(f"Failed to write labels, will retry: {e}", file=sys.stderr)
+                    self._write_error = f"Failed to write label: {e}"
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.ok = not unwritten
+                    item.set()
+
+    def flush(self):
+        # Block until every line queued so far has had a write attempt.
+        # Returns False if some of them are still waiting to be retried.
+        done = threading.Event()
+        self._write_q.put(done)
+        done.wait()
+        return done.ok
+
+    def _append_tombstones(self, records):
+        # Mark labels as removed without rewriting labels.jsonl.
+        data = b"".join(
+            _json_line({"user": rec.get("user"), "id": rec.get("id"), "ts": rec.get("ts")}) for rec in records
+        )
+        try:
+            with open(self.deleted_path, "ab") as f:
+                f.write(data)
+        except Exception as e:
+            return f"failed to write: {e}"
+        self._tombstone_count += len(records)
+        return None
+
+    def _maybe_compact_labels(self):
+        # Fold tombstones back into labels.jsonl once they exceed a quarter of the live labels
+        if self._tombstone_count <= (len(self._records) - self._dead_records) // 4:
+            return
+        err = self._rewrite_labels()
+        if err:
+            print(f"Failed to compact labels: {err}", file=sys.stderr)
+
+    def _rewrite_labels(self):
+        # Atomically replace labels.jsonl with the live records.
+        # The result holds no removed records, so the tombstone file is cleared too.
+        # Pending appends must land first or the rename would orphan them.
+        if not self.flush():
+            return "pending labels could not be written"
+        tmp_path = self.labels_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.writelines(_json_line(rec) for rec in self._records if rec is not None)
+            os.replace(tmp_path, self.labels_path)
+        except Exception as e:
+            try:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            except Exception:
+                pass
+            return f"failed to write: {e}"
+        if self._tombstone_count:
+            try:
+                os.remove(self.deleted_path)
+                self._tombstone_count = 0
+            except Exception:
+                pass
+        return None
+
     def _load_or_create_secret(self):
         try:
             if os.path.exists(SECRET_PATH):
@@ -153,97 +446,105 @@ class State:
         for vid in expired:
             del self.assigned[vid]
 
-    def _eligible_videos(self):
-        # Returns list of video ids that can be assigned
+    def _refresh_videos(self):
         # Rescan videos to pick up new files without restarting the server
-        self.videos = self._scan_videos()
-        self._prune_assignments()
-        eligible = []
-        for vid in self.videos:
-            if vid in self.assigned:
-                continue
-            if SINGLE_LABEL_PER_VIDEO and vid in self.labeled_ids:
-                continue
-            eligible.append(vid)
-        return eligible
+        videos = self._scan_videos()
+        if videos is self.videos:
+            return
+        self.videos = videos
+        self._video_set = set(videos)
+        self.unlabeled = self._video_set - self.labeled_ids
+        self._videos_version += 1
+
+    def _mark_labeled(self, vid):
+        self.labeled_ids.add(vid)
+        self.unlabeled.discard(vid)
+
+    def _mark_unlabeled(self, vid):
+        self.labeled_ids.discard(vid)
+        if vid in self._video_set:
+            self.unlabeled.add(vid)
 
     def _rebalance_if_needed(self):
         # Recompute ownership of unlabeled videos when participants/dataset changes
         participants = sorted(self.active_users | set(self.per_user_counts.keys()))
-        sig = (tuple(participants), len(self.videos), len(self.labeled_ids))
+        self._participants = participants
+        sig = (tuple(participants), self._videos_version, len(self.labeled_ids))
         if self._balance_sig == sig:
-            # Still ensure owner_map covers unlabeled set
-            unlabeled = {v for v in self.videos if v not in self.labeled_ids}
-            missing = [v for v in unlabeled if v not in self.owner_map]
-            if not missing:
-                return
+            return
         # Recompute
         self._balance_sig = sig
         self.owner_map = {}
+        self._owner_queues = {}
         if not participants:
             return
         total = len(self.videos)
         n = len(participants)
         base = total // n
         rem = total % n
-        # Target total per participant: base or base+1 for first rem users
-        targets = {}
-        for i, u in enumerate(participants):
-            targets[u] = base + (1 if i < rem else 0)
-        # Current labeled counts for participants
-        labeled_counts = {u: self.per_user_counts.get(u, 0) for u in participants}
-        # Need is how many more until target (clamped >=0)
-        need = {u: max(0, targets[u] - labeled_counts.get(u, 0)) for u in participants}
-        # Assign all unlabeled videos to users in a round-robin by remaining need
-        unlabeled = [v for v in self.videos if v not in self.labeled_ids]
+        # Target total per participant is base or base+1 for the first rem users;
+        # need is how many more labels until that target (clamped >=0)
+        needs = [
+            max(0, base + (1 if i < rem else 0) - self.per_user_counts.get(u, 0))
+            for i, u in enumerate(participants)
+        ]
+        # Assign all unlabeled videos to users in a round-robin by remaining need:
+        # slot j of the cycle belongs to the user whose cumulative need range holds j
+        # self.videos is sorted, so filtering it keeps the order in O(N) (no sort)
+        unlabeled = [v for v in self.videos if v in self.unlabeled]
         if not unlabeled:
             return
-        # Build a queue of users repeated by remaining need
-        queue = []
-        for u in participants:
-            count = need.get(u, 0)
-            queue.extend([u] * count)
-        if not queue:
+        cum = list(itertools.accumulate(needs))
+        cycle = cum[-1]
+        if not cycle:
             # No one needs more (oversubscribed case); leave unowned
             return
-        qi = 0
-        qlen = len(queue)
-        for vid in unlabeled:
-            owner = queue[qi]
+        for i, vid in enumerate(unlabeled):
+            owner = participants[bisect.bisect_right(cum, i % cycle)]
             self.owner_map[vid] = owner
-            qi = (qi + 1) % qlen
+            self._owner_queues.setdefault(owner, deque()).append(vid)
+
+    def _next_owned(self, user):
+        # First video owned by user that is neither labeled nor assigned.
+        # Labeled videos never return to the queue, so drop them from the front;
+        # assigned ones may be released again and are only skipped.
+        q = self._owner_queues.get(user)
+        if not q:
+            return None
+        while q and q[0] in self.labeled_ids:
+            q.popleft()
+        for vid in q:
+            if vid not in self.assigned and vid not in self.labeled_ids:
+                return vid
+        return None
 
     def peek_next(self):
         with self.lock:
-            eligible = self._eligible_videos()
+            self._refresh_videos()
+            self._prune_assignments()
             # Return first eligible globally
-            return eligible[0] if eligible else None
+            if SINGLE_LABEL_PER_VIDEO:
+                return min((v for v in self.unlabeled if v not in self.assigned), default=None)
+            return next((v for v in self.videos if v not in self.assigned), None)
 
     def peek_next_for_user(self, user):
         with self.lock:
             # Ensure latest videos before balancing
-            self.videos = self._scan_videos()
+            self._refresh_videos()
             self.active_users.add(user)
             self._rebalance_if_needed()
-            eligible = self._eligible_videos()
-            for vid in eligible:
-                if self.owner_map.get(vid) == user:
-                    return vid
-            return None
+            self._prune_assignments()
+            return self._next_owned(user)
 
     def assign_next(self, user):
         with self.lock:
             # Ensure latest videos before balancing
-            self.videos = self._scan_videos()
+            self._refresh_videos()
             self.active_users.add(user)
             self._rebalance_if_needed()
-            eligible = self._eligible_videos()
-            # Prefer videos owned by this user
-            vid = None
-            for v in eligible:
-                if self.owner_map.get(v) == user:
-                    vid = v
-                    break
+            self._prune_assignments()
+            # Only videos owned by this user are handed out
+            vid = self._next_owned(user)
             if not vid:
                 # If none owned, consider done for this user (balanced)
                 return None
@@ -263,21 +564,26 @@ class State:
         label = payload.get("label")
         if not vid or not user or label not in ("ok", "not_ok"):
             return False, "Invalid payload"
+        if self._write_error:
+            # Do not acknowledge labels that may never reach the file
+            return False, self._write_error
         now_ms = int(time.time() * 1000)
         payload["ts"] = now_ms
-        line = json.dumps(payload, ensure_ascii=False)
+        try:
+            line = _json_line(payload)
+        except (TypeError, ValueError) as e:
+            # e.g. a lone surrogate that json.loads accepted but UTF-8 cannot encode
+            return False, f"Failed to write label: {e}"
         with self.lock:
             # Only accept if assigned to this user or no assignment present.
             info = self.assigned.get(vid)
             if info and info["user"] != user:
                 return False, "Assigned to another user"
-            try:
-                with open(self.labels_path, "a", encoding="utf-8") as f:
-                    f.write(line + "\n")
-            except Exception as e:
-                return False, f"Failed to write label: {e}"
+            self._write_q.put(line)
+            self._index_record(payload)
+            self._stats_json = None
             self.per_user_counts[user] = self.per_user_counts.get(user, 0) + 1
-            self.labeled_ids.add(vid)
+            self._mark_labeled(vid)
             # Release assignment if exists
             if vid in self.assigned:
                 del self.assigned[vid]
@@ -287,43 +593,24 @@ class State:
         if not user or not vid:
             return False, "invalid params"
         with self.lock:
-            rows = []
-            removed = 0
-            try:
-                if os.path.exists(self.labels_path):
-                    with open(self.labels_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            if not line.strip():
-                                continue
-                            try:
-                                rec = json.loads(line)
-                            except Exception:
-                                continue
-                            if rec.get("user") == user and rec.get("id") == vid and removed == 0:
-                                removed = 1
-                                continue
-                            rows.append(rec)
-            except Exception as e:
-                return False, f"failed to read: {e}"
-            if removed == 0:
+            # Remove the earliest label of this video by the user
+            pos = None
+            for i in self._user_index.get(user, []):
+                rec = self._records[i]
+                if rec is not None and rec.get("id") == vid:
+                    pos = i
+                    break
+            if pos is None:
                 return True, "not found"
-            tmp_path = self.labels_path + ".tmp"
-            try:
-                with open(tmp_path, "w", encoding="utf-8") as f:
-                    for rec in rows:
-                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                os.replace(tmp_path, self.labels_path)
-            except Exception as e:
-                try:
-                    if os.path.exists(tmp_path):
-                        os.remove(tmp_path)
-                except Exception:
-                    pass
-                return False, f"failed to write: {e}"
+            err = self._append_tombstones([self._records[pos]])
+            if err:
+                return False, err
+            self._drop_records([pos])
+            self._stats_json = None
+            self._maybe_compact_labels()
             # Update memory
             self.per_user_counts[user] = max(0, self.per_user_counts.get(user, 0) - 1)
-            if vid in self.labeled_ids:
-                self.labeled_ids.discard(vid)
+            self._mark_unlabeled(vid)
             self._balance_sig = None
             return True, "ok"
 
@@ -331,65 +618,37 @@ class State:
         if not user or count <= 0:
             return False, "invalid params", []
         with self.lock:
-            # Read all rows, find last N for user
-            rows = []
-            idx_user = []
-            try:
-                if os.path.exists(self.labels_path):
-                    with open(self.labels_path, "r", encoding="utf-8") as f:
-                        for i, line in enumerate(f):
-                            line = line.strip()
-                            if not line:
-                                continue
-                            try:
-                                rec = json.loads(line)
-                            except Exception:
-                                continue
-                            rows.append(rec)
-                            if rec.get("user") == user:
-                                idx_user.append(len(rows) - 1)
-            except Exception as e:
-                return False, f"failed to read: {e}", []
-
-            if not idx_user:
-                return True, "nothing to undo", []
-            k = min(count, len(idx_user))
-            pos_batch = idx_user[-k:]
-            to_remove_positions = set(pos_batch)
-            undone_ids = []
-            undone_records = []
-            new_rows = []
-            for i, rec in enumerate(rows):
-                if i in to_remove_positions:
-                    vid = rec.get("id")
-                    if vid:
-                        undone_ids.append(vid)
-                    undone_records.append(rec)
+            # Walk the user's index from the end to find their last N labels
+            pos_batch = []
+            for i in reversed(self._user_index.get(user, [])):
+                if self._records[i] is None:
                     continue
-                new_rows.append(rec)
+                pos_batch.append(i)
+                if len(pos_batch) >= count:
+                    break
+            if not pos_batch:
+                return True, "nothing to undo", []
+            pos_batch.reverse()
+            undone_records = [self._records[i] for i in pos_batch]
+            undone_ids = [rec.get("id") for rec in undone_records if rec.get("id")]
 
-            # Write back safely
-            tmp_path = self.labels_path + ".tmp"
-            try:
-                with open(tmp_path, "w", encoding="utf-8") as f:
-                    for rec in new_rows:
-                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                os.replace(tmp_path, self.labels_path)
-            except Exception as e:
-                try:
-                    if os.path.exists(tmp_path):
-                        os.remove(tmp_path)
-                except Exception:
-                    pass
-                return False, f"failed to write: {e}", []
+            err = self._append_tombstones(undone_records)
+            if err:
+                return False, err, []
+            self._drop_records(pos_batch)
+            # Trim the removed tail so the next undo starts at a live entry
+            idx = self._user_index.get(user)
+            while idx and self._records[idx[-1]] is None:
+                idx.pop()
+            self._stats_json = None
+            self._maybe_compact_labels()
 
             # Update in-memory stats
             removed = len(undone_ids)
             if removed > 0:
                 self.per_user_counts[user] = max(0, self.per_user_counts.get(user, 0) - removed)
                 for vid in undone_ids:
-                    if vid in self.labeled_ids:
-                        self.labeled_ids.discard(vid)
+                    self._mark_unlabeled(vid)
                 # Force rebalance on next request
                 self._balance_sig = None
                 # Save last undo batch for redo
@@ -403,28 +662,59 @@ class State:
             batch = self.last_undo.get(user)
             if not batch:
                 return True, "nothing to redo", 0
+            if self._write_error:
+                return False, self._write_error, 0
             appended = 0
-            try:
-                with open(self.labels_path, "a", encoding="utf-8") as f:
-                    for rec in batch:
-                        vid = rec.get("id")
-                        if SINGLE_LABEL_PER_VIDEO and vid in self.labeled_ids:
-                            continue
-                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-                        self.per_user_counts[user] = self.per_user_counts.get(user, 0) + 1
-                        if vid:
-                            self.labeled_ids.add(vid)
-                        appended += 1
-            except Exception as e:
-                return False, f"failed to write: {e}", 0
+            for rec in batch:
+                vid = rec.get("id")
+                if SINGLE_LABEL_PER_VIDEO and vid in self.labeled_ids:
+                    continue
+                self._write_q.put(_json_line(rec))
+                self._index_record(rec)
+                self.per_user_counts[user] = self.per_user_counts.get(user, 0) + 1
+                if vid:
+                    self._mark_labeled(vid)
+                appended += 1
             # Clear stored batch
             self.last_undo[user] = []
+            self._stats_json = None
             self._balance_sig = None
             return True, "ok", appended
 
+    def stats_json(self):
+        # /api/stats is polled by every client; re-encode only after a change.
+        with self.lock:
+            if self._stats_json is None:
+                total = len(self.videos)
+                labeled = len(self.labeled_ids) if SINGLE_LABEL_PER_VIDEO else sum(self.per_user_counts.values())
+                remaining = max(0, total - len(self.labeled_ids))
+                self._stats_json = _json_bytes({
+                    "total": total,
+                    "labeled": labeled,
+                    "remaining": remaining,
+                    "perUser": self.per_user_counts,
+                    "singleLabelPerVideo": SINGLE_LABEL_PER_VIDEO,
+                })
+            return self._stats_json
+
+    def list_labels(self, user=None, label=None, limit=1000):
+        # Latest first; served from memory, labels.jsonl is not re-read.
+        # Walk backwards and stop after `limit` matches instead of slicing a full copy.
+        with self.lock:
+            positions = self._user_index.get(user, []) if user else range(len(self._records))
+            rows = []
+            for i in reversed(positions):
+                rec = self._records[i]
+                if rec is None or (label and rec.get("label") != label):
+                    continue
+                rows.append(rec)
+                if len(rows) >= limit:
+                    break
+            return rows
+
     def get_user_stats(self, user):
         with self.lock:
-            self.videos = self._scan_videos()
+            self._refresh_videos()
             total = len(self.videos)
             labeled_global = len(self.labeled_ids) if SINGLE_LABEL_PER_VIDEO else sum(self.per_user_counts.values())
             remaining_global = max(0, total - len(self.labeled_ids))
@@ -440,7 +730,7 @@ class State:
             self._rebalance_if_needed()
             my_labeled = self.per_user_counts.get(user, 0)
             # Compute target via same distribution used by balancer
-            participants = sorted(self.active_users | set(self.per_user_counts.keys()))
+            participants = self._participants
             n = max(1, len(participants))
             base = total // n
             rem = total % n
@@ -468,237 +758,316 @@ class State:
 STATE = None
 
 
+MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".m4v": "video/x-m4v",
+    ".mov": "video/quicktime",
+    ".js": "application/javascript",
+    ".css": "text/css",
+    ".html": "text/html; charset=utf-8",
+    ".htm": "text/html; charset=utf-8",
+    ".json": "application/json",
+}
+
+
 def guess_mime(path):
-    ext = os.path.splitext(path)[1].lower()
-    if ext == ".mp4":
-        return "video/mp4"
-    if ext == ".webm":
-        return "video/webm"
-    if ext == ".m4v":
-        return "video/x-m4v"
-    if ext == ".mov":
-        return "video/quicktime"
-    if ext == ".js":
-        return "application/javascript"
-    if ext == ".css":
-        return "text/css"
-    if ext in (".html", ".htm"):
-        return "text/html; charset=utf-8"
-    if ext == ".json":
-        return "application/json"
-    return "application/octet-stream"
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+STATIC_CACHE = {}  # path -> (mtime_ns, mime, data, gzipped data or None)
+
+
+def load_static(path):
+    # Static assets are small and requested on every page load: keep them in
+    # memory, along with a gzipped copy, until the file's mtime changes.
+    mtime = os.stat(path).st_mtime_ns
+    ent = STATIC_CACHE.get(path)
+    if ent and ent[0] == mtime:
+        return ent
+    with open(path, "rb") as f:
+        data = f.read()
+    gz = gzip.compress(data, 6)
+    ent = (mtime, guess_mime(path), data, gz if len(gz) < len(data) else None)
+    STATIC_CACHE[path] = ent
+    return ent
+
+
+def accepts_gzip(accept_encoding):
+    # Parse "gzip;q=0.5, br, *;q=0" style Accept-Encoding. An explicit gzip
+    # entry wins over "*"; q=0 (or an unreadable q) means not acceptable.
+    star = None
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("gzip", "x-gzip", "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding == "*":
+            star = q
+        else:
+            return q > 0
+    return star is not None and star > 0
 
 
 class Handler(BaseHTTPRequestHandler):
     server_version = "FastVideoLabel/0.1"
+    # Keep-alive: browsers reuse one connection for many API calls. Every
+    # response must carry Content-Length (or close the connection).
+    protocol_version = "HTTP/1.1"
+    # Socket timeout while a request is being read or answered. Idle time
+    # between keep-alive requests is timed out by PooledHTTPServer instead.
+    timeout = KEEPALIVE_TIMEOUT_SEC
+    # Small JSON responses should not wait on Nagle's algorithm (sets TCP_NODELAY)
+    disable_nagle_algorithm = True
+    # Per-request attributes get fixed slots instead of instance-dict entries
+    __slots__ = ("_cookie_cache", "_qs")
+
+    def parse_request(self):
+        # Per-request caches are reset here, before each request is dispatched
+        self._cookie_cache = None
+        return super().parse_request()
 
     def _video_url(self, vid: str) -> str:
         # Return URL-encoded path for client usage
         return "/videos/" + quote(vid)
 
     def _send_json(self, obj, status=200):
-        data = json.dumps(obj).encode("utf-8")
+        self._send_json_bytes(_json_bytes(obj), status)
+
+    def _end_headers_with_body(self, body):
+        # Like end_headers(), but the body joins the buffered status line and
+        # headers so the whole response goes out in one write.
+        if self.request_version == "HTTP/0.9":
+            self.wfile.write(body)
+            return
+        self._headers_buffer.append(b"\r\n")
+        self._headers_buffer.append(body)
+        self.flush_headers()
+
+    def _send_json_bytes(self, data, status=200):
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(data)))
         self.send_header("Cache-Control", "no-store")
-        self.end_headers()
-        self.wfile.write(data)
+        self._end_headers_with_body(data)
+
+    # --- Routing
+    # Exact-path routes live in the _GET_ROUTES/_POST_ROUTES tables at the end
+    # of the class, so dispatch is a single dict lookup instead of walking an
+    # if-chain. Only /static/, /videos/ and the static fallback need prefix
+    # handling.
 
     def do_GET(self):
-        global STATE
-        parsed = urlparse(self.path)
-        path = parsed.path
-
-        if path == "/" or path == "/index.html":
-            return self._serve_static("index.html")
-        if path == "/review":
-            return self._serve_static("review.html")
-        if path == "/my":
-            return self._serve_static("my.html")
+        # Slice on "?" rather than urlparse(); this runs on every request.
+        raw = self.path
+        q = raw.find("?")
+        if q < 0:
+            path = raw
+            self._qs = {}
+        else:
+            path = raw[:q]
+            # Parsed once here; route handlers read self._qs.
+            self._qs = parse_qs(raw[q + 1 :])
+
+        route = self._GET_ROUTES.get(path)
+        if route is not None:
+            return route(self)
         if path.startswith("/static/"):
-            rel = path[len("/static/") :]
-            return self._serve_file(os.path.join(STATIC_DIR, rel), cache=True)
-        if path.startswith("/videos/"):
-            rel = unquote(path[len("/videos/") :])
-            safe = os.path.normpath(rel)
-            if safe.startswith(".."):
+            full = safe_join(STATIC_DIR, path[len("/static/") :])
+            if not full:
                 self.send_error(HTTPStatus.FORBIDDEN, "Forbidden")
                 return
-            return self._serve_video(os.path.join(VIDEOS_DIR, safe))
-        if path == "/api/next":
-            qs = parse_qs(parsed.query)
-            user = (qs.get("user") or [""])[0].strip()
-            if not user:
-                return self._send_json({"error": "missing user"}, 400)
-            vid = STATE.assign_next(user)
-            if not vid:
-                return self._send_json({"done": True})
-            return self._send_json({
-                "id": vid,
-                "url": self._video_url(vid),
-            })
-        if path == "/api/peek":
-            qs = parse_qs(parsed.query)
-            user = (qs.get("user") or [None])[0]
-            vid = STATE.peek_next_for_user(user) if user else STATE.peek_next()
-            if not vid:
-                return self._send_json({"done": True})
-            return self._send_json({"id": vid, "url": self._video_url(vid)})
-        if path == "/api/user_labels":
-            qs = parse_qs(parsed.query)
-            user = (qs.get("user") or [None])[0]
-            flt = (qs.get("label") or ["all"])[0]
-            limit = int((qs.get("limit") or ["1000"])[0])
-            limit = max(1, min(20000, limit))
-            if not user:
-                return self._send_json({"error": "missing user"}, 400)
-            rows = []
-            try:
-                if os.path.exists(STATE.labels_path):
-                    with open(STATE.labels_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            try:
-                                rec = json.loads(line)
-                            except Exception:
-                                continue
-                            if rec.get("user") != user:
-                                continue
-                            if flt in ("ok", "not_ok") and rec.get("label") != flt:
-                                continue
-                            rows.append(rec)
-                rows = rows[-limit:][::-1]
-            except Exception as e:
-                return self._send_json({"error": str(e)}, 500)
-            return self._send_json({"items": rows, "count": len(rows)})
-        if path == "/api/stats":
-            total = len(STATE.videos)
-            labeled = len(STATE.labeled_ids) if SINGLE_LABEL_PER_VIDEO else sum(STATE.per_user_counts.values())
-            remaining = max(0, total - len(STATE.labeled_ids))
-            return self._send_json({
-                "total": total,
-                "labeled": labeled,
-                "remaining": remaining,
-                "perUser": STATE.per_user_counts,
-                "singleLabelPerVideo": SINGLE_LABEL_PER_VIDEO,
-            })
-        if path == "/api/mystats":
-            qs = parse_qs(parsed.query)
-            user = (qs.get("user") or [None])[0]
-            data = STATE.get_user_stats(user)
-            return self._send_json(data)
-        if path == "/api/users":
-            if not self._require_reviewer():
-                return
-            return self._send_json({
-                "perUser": STATE.per_user_counts,
-                "totalVideos": len(STATE.videos),
-            })
-        if path == "/api/labels":
-            if not self._require_reviewer():
+            return self._serve_file(full, cache=True)
+        if path.startswith("/videos/"):
+            full = safe_join(VIDEOS_DIR, unquote(path[len("/videos/") :]))
+            if not full:
+                self.send_error(HTTPStatus.FORBIDDEN, "Forbidden")
                 return
-            qs = parse_qs(parsed.query)
-            user = (qs.get("user") or [None])[0]
-            limit = int((qs.get("limit") or ["1000"])[0])
-            limit = max(1, min(20000, limit))
-            rows = []
-            try:
-                if os.path.exists(STATE.labels_path):
-                    with open(STATE.labels_path, "r", encoding="utf-8") as f:
-                        for line in f:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            try:
-                                rec = json.loads(line)
-                                if user and rec.get("user") != user:
-                                    continue
-                                rows.append(rec)
-                            except Exception:
-                                continue
-                # Return latest first
-                rows = rows[-limit:][::-1]
-            except Exception as e:
-                return self._send_json({"error": str(e)}, 500)
-            return self._send_json({"items": rows, "count": len(rows)})
+            return self._serve_video(full)
 
         # Fallback to static
         p = path.lstrip("/")
         if p:
-            maybe = os.path.join(STATIC_DIR, p)
-            if os.path.isfile(maybe):
+            maybe = safe_join(STATIC_DIR, p)
+            if maybe and os.path.isfile(maybe):
                 return self._serve_file(maybe, cache=False)
         self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
 
     def do_POST(self):
-        global STATE
-        parsed = urlparse(self.path)
-        path = parsed.path
+        q = self.path.find("?")
+        path = self.path if q < 0 else self.path[:q]
         length = int(self.headers.get("Content-Length") or 0)
         raw = self.rfile.read(length) if length else b"{}"
         try:
-            payload = json.loads(raw.decode("utf-8"))
+            payload = _json_loads(raw)
         except Exception:
             payload = {}
 
-        if path == "/api/label":
-            ok, msg = STATE.record_label(payload)
-            if ok:
-                return self._send_json({"ok": True})
-            return self._send_json({"ok": False, "error": msg}, 400)
-        if path == "/api/skip":
-            vid = payload.get("id")
-            user = payload.get("user")
-            if not vid:
-                return self._send_json({"ok": False, "error": "missing id"}, 400)
-            STATE.release(vid, user)
-            return self._send_json({"ok": True})
-        if path == "/api/unlabel":
-            user = (payload.get("user") or "").strip()
-            vid = (payload.get("id") or "").strip()
-            ok, msg = STATE.remove_label(user, vid)
-            if ok:
-                return self._send_json({"ok": True})
-            return self._send_json({"ok": False, "error": msg}, 400)
-        if path == "/api/reviewer/login":
-            pwd = (payload.get("password") or "").strip()
-            if not pwd:
-                return self._send_json({"ok": False, "error": "missing password"}, 400)
-            if pwd != REVIEWER_PASSWORD:
-                return self._send_json({"ok": False, "error": "invalid password"}, 401)
-            token = self._reviewer_token()
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", "application/json")
-            self._set_reviewer_cookie(token)
-            self.end_headers()
-            self.wfile.write(b'{"ok": true}')
+        route = self._POST_ROUTES.get(path)
+        if route is not None:
+            return route(self, payload)
+        self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
+
+    def _q(self, key, default=None):
+        return (self._qs.get(key) or [default])[0]
+
+    # --- GET routes
+
+    def _get_index(self):
+        return self._serve_static("index.html")
+
+    def _get_review(self):
+        return self._serve_static("review.html")
+
+    def _get_my(self):
+        return self._serve_static("my.html")
+
+    def _get_next(self):
+        user = self._q("user", "").strip()
+        if not user:
+            return self._send_json({"error": "missing user"}, 400)
+        vid = STATE.assign_next(user)
+        if not vid:
+            return self._send_json({"done": True})
+        return self._send_json({
+            "id": vid,
+            "url": self._video_url(vid),
+        })
+
+    def _get_peek(self):
+        user = self._q("user")
+        vid = STATE.peek_next_for_user(user) if user else STATE.peek_next()
+        if not vid:
+            return self._send_json({"done": True})
+        return self._send_json({"id": vid, "url": self._video_url(vid)})
+
+    def _get_user_labels(self):
+        user = self._q("user")
+        flt = self._q("label", "all")
+        limit = int(self._q("limit", "1000"))
+        limit = max(1, min(20000, limit))
+        if not user:
+            return self._send_json({"error": "missing user"}, 400)
+        rows = STATE.list_labels(user, flt if flt in ("ok", "not_ok") else None, limit)
+        return self._send_json({"items": rows, "count": len(rows)})
+
+    def _get_stats(self):
+        return self._send_json_bytes(STATE.stats_json())
+
+    def _get_mystats(self):
+        data = STATE.get_user_stats(self._q("user"))
+        return self._send_json(data)
+
+    def _get_users(self):
+        if not self._require_reviewer():
             return
-        if path == "/api/reviewer/logout":
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", "application/json")
-            # expire cookie
-            self.send_header("Set-Cookie", "rev=; Max-Age=0; Path=/; HttpOnly; SameSite=Lax")
-            self.end_headers()
-            self.wfile.write(b'{"ok": true}')
+        return self._send_json({
+            "perUser": STATE.per_user_counts,
+            "totalVideos": len(STATE.videos),
+        })
+
+    def _get_labels(self):
+        if not self._require_reviewer():
             return
-        if path == "/api/undo":
-            user = (payload.get("user") or "").strip()
-            count = int(payload.get("count") or 0)
-            ok, msg, ids = STATE.undo_last(user, count)
-            if ok:
-                return self._send_json({"ok": True, "undone": len(ids), "ids": ids})
-            return self._send_json({"ok": False, "error": msg}, 400)
-        if path == "/api/redo":
-            user = (payload.get("user") or "").strip()
-            ok, msg, n = STATE.redo_last(user)
-            if ok:
-                return self._send_json({"ok": True, "redone": n})
-            return self._send_json({"ok": False, "error": msg}, 400)
+        user = self._q("user")
+        limit = int(self._q("limit", "1000"))
+        limit = max(1, min(20000, limit))
+        # Return latest first
+        rows = STATE.list_labels(user, None, limit)
+        return self._send_json({"items": rows, "count": len(rows)})
 
-        self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
+    # --- POST routes
+
+    def _post_label(self, payload):
+        ok, msg = STATE.record_label(payload)
+        if ok:
+            return self._send_json_bytes(OK_JSON)
+        return self._send_json({"ok": False, "error": msg}, 400)
+
+    def _post_skip(self, payload):
+        vid = payload.get("id")
+        user = payload.get("user")
+        if not vid:
+            return self._send_json({"ok": False, "error": "missing id"}, 400)
+        STATE.release(vid, user)
+        return self._send_json_bytes(OK_JSON)
+
+    def _post_unlabel(self, payload):
+        user = (payload.get("user") or "").strip()
+        vid = (payload.get("id") or "").strip()
+        ok, msg = STATE.remove_label(user, vid)
+        if ok:
+            return self._send_json_bytes(OK_JSON)
+        return self._send_json({"ok": False, "error": msg}, 400)
+
+    def _post_reviewer_login(self, payload):
+        pwd = (payload.get("password") or "").strip()
+        if not pwd:
+            return self._send_json({"ok": False, "error": "missing password"}, 400)
+        # Constant-time compare so response timing does not leak the password
+        if not hmac.compare_digest(pwd.encode("utf-8"), REVIEWER_PASSWORD_BYTES):
+            return self._send_json({"ok": False, "error": "invalid password"}, 401)
+        token = self._reviewer_token()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(OK_JSON)))
+        self._set_reviewer_cookie(token)
+        self._end_headers_with_body(OK_JSON)
+
+    def _post_reviewer_logout(self, payload):
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(OK_JSON)))
+        # expire cookie
+        self.send_header("Set-Cookie", "rev=; Max-Age=0; Path=/; HttpOnly; SameSite=Lax")
+        self._end_headers_with_body(OK_JSON)
+
+    def _post_undo(self, payload):
+        user = (payload.get("user") or "").strip()
+        count = int(payload.get("count") or 0)
+        ok, msg, ids = STATE.undo_last(user, count)
+        if ok:
+            return self._send_json({"ok": True, "undone": len(ids), "ids": ids})
+        return self._send_json({"ok": False, "error": msg}, 400)
+
+    def _post_redo(self, payload):
+        user = (payload.get("user") or "").strip()
+        ok, msg, n = STATE.redo_last(user)
+        if ok:
+            return self._send_json({"ok": True, "redone": n})
+        return self._send_json({"ok": False, "error": msg}, 400)
+
+    _GET_ROUTES = {
+        "/": _get_index,
+        "/index.html": _get_index,
+        "/review": _get_review,
+        "/my": _get_my,
+        "/api/next": _get_next,
+        "/api/peek": _get_peek,
+        "/api/user_labels": _get_user_labels,
+        "/api/stats": _get_stats,
+        "/api/mystats": _get_mystats,
+        "/api/users": _get_users,
+        "/api/labels": _get_labels,
+    }
+
+    _POST_ROUTES = {
+        "/api/label": _post_label,
+        "/api/skip": _post_skip,
+        "/api/unlabel": _post_unlabel,
+        "/api/reviewer/login": _post_reviewer_login,
+        "/api/reviewer/logout": _post_reviewer_logout,
+        "/api/undo": _post_undo,
+        "/api/redo": _post_redo,
+    }
 
     # --- Static helpers
     def _serve_static(self, name):
@@ -710,104 +1079,314 @@ class Handler(BaseHTTPRequestHandler):
             self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
             return
         try:
-            with open(path, "rb") as f:
-                data = f.read()
+            _mtime, mime, data, gz = load_static(path)
         except Exception as e:
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
             return
-        mime = guess_mime(path)
+        use_gzip = gz is not None and accepts_gzip(self.headers.get("Accept-Encoding"))
+        body = gz if use_gzip else data
         self.send_response(HTTPStatus.OK)
         self.send_header("Content-Type", mime)
-        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Length", str(len(body)))
+        if gz is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
         if cache:
             self.send_header("Cache-Control", "public, max-age=604800, immutable")
         else:
             self.send_header("Cache-Control", "no-store")
-        self.end_headers()
-        self.wfile.write(data)
+        self._end_headers_with_body(body)
 
     def _serve_video(self, path):
         if not os.path.isfile(path):
             self.send_error(HTTPStatus.NOT_FOUND, "Not Found")
             return
         try:
-            file_size = os.path.getsize(path)
-            range_header = self.headers.get("Range")
-            if range_header:
-                # Simple Range: bytes=start-end
-                try:
-                    units, rng = range_header.split("=", 1)
-                    if units.strip() != "bytes":
-                        raise ValueError
-                    start_s, end_s = (rng.split("-", 1) + [""])[:2]
-                    start = int(start_s) if start_s else 0
-                    end = int(end_s) if end_s else file_size - 1
-                    if start < 0 or end < start:
-                        raise ValueError
-                    end = min(end, file_size - 1)
-                except Exception:
-                    self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                file_size = st.st_size
+                # Validator from size+mtime: a re-fetch of an unchanged clip
+                # (seek, replay, revisit) gets a bodiless 304.
+                etag = f'"{file_size:x}-{st.st_mtime_ns:x}"'
+                inm = self.headers.get("If-None-Match")
+                if inm and (inm.strip() == "*" or etag in (t.strip() for t in inm.split(","))):
+                    self.send_response(HTTPStatus.NOT_MODIFIED)
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "public, max-age=604800")
+                    self.end_headers()
                     return
-                length = end - start + 1
-                with open(path, "rb") as f:
-                    f.seek(start)
-                    data = f.read(length)
-                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                range_header = self.headers.get("Range")
+                if range_header:
+                    # Simple Range: bytes=start-end
+                    try:
+                        units, rng = range_header.split("=", 1)
+                        if units.strip() != "bytes":
+                            raise ValueError
+                        start_s, end_s = (rng.split("-", 1) + [""])[:2]
+                        start = int(start_s) if start_s else 0
+                        end = int(end_s) if end_s else file_size - 1
+                        if start < 0 or end < start:
+                            raise ValueError
+                        end = min(end, file_size - 1)
+                        if start > end:
+                            raise ValueError
+                    except Exception:
+                        self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                        return
+                    length = end - start + 1
+                    self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                    self.send_header("Content-Type", guess_mime(path))
+                    self.send_header("Accept-Ranges", "bytes")
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+                    self.send_header("Content-Length", str(length))
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", "public, max-age=604800")
+                    self.end_headers()
+                    self._send_file_body(f, start, length)
+                    return
+                # No Range: send whole file
+                self.send_response(HTTPStatus.OK)
                 self.send_header("Content-Type", guess_mime(path))
                 self.send_header("Accept-Ranges", "bytes")
-                self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
-                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Content-Length", str(file_size))
+                self.send_header("ETag", etag)
                 self.send_header("Cache-Control", "public, max-age=604800")
                 self.end_headers()
-                self.wfile.write(data)
-                return
-            # No Range: send whole file
-            with open(path, "rb") as f:
-                data = f.read()
-            self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Type", guess_mime(path))
-            self.send_header("Accept-Ranges", "bytes")
-            self.send_header("Content-Length", str(len(data)))
-            self.send_header("Cache-Control", "public, max-age=604800")
-            self.end_headers()
-            self.wfile.write(data)
+                self._send_file_body(f, 0, file_size)
         except Exception as e:
             self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
 
+    def _send_file_body(self, f, offset, count):
+        # Hand the body to the kernel: socket.sendfile uses os.sendfile (no
+        # userspace copy). Anything still buffered in wfile must go out first.
+        # The headers are already out, so a failure here can only drop the
+        # connection; send_error() would splice an error page into the body.
+        if count <= 0:
+            return
+        sock = self.connection
+        # A paused player stops reading once its buffer is full, so each write
+        # gets the longer VIDEO_SEND_TIMEOUT_SEC; a reader stalled past that is
+        # dropped rather than holding its thread forever.
+        sock.settimeout(VIDEO_SEND_TIMEOUT_SEC)
+        try:
+            self.wfile.flush()
+            if HAS_SENDFILE:
+                if sock.sendfile(f, offset, count) < count:
+                    # File shrank under us; the body is short of Content-Length
+                    self.close_connection = True
+                return
+            # No os.sendfile (e.g. Windows): stream through one reusable buffer
+            # rather than socket.sendfile's 8 KiB fallback or a full-size read.
+            f.seek(offset)
+            buf = memoryview(bytearray(min(count, FILE_CHUNK_SIZE)))
+            while count > 0:
+                n = f.readinto(buf[: min(count, len(buf))])
+                if not n:
+                    # File shrank under us; the body is short of Content-Length
+                    self.close_connection = True
+                    break
+                self.wfile.write(buf[:n])
+                count -= n
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            # Client moved on (next clip, seek) or stalled; nothing to report
+            self.close_connection = True
+        except Exception as e:
+            self.log_error("video body aborted: %s", e)
+            self.close_connection = True
+        finally:
+            try:
+                sock.settimeout(self.timeout)
+            except OSError:
+                pass
+
     # --- Reviewer auth helpers
     def _reviewer_token(self):
-        msg = b"reviewer"
-        return hmac.new(STATE.secret, msg, hashlib.sha256).hexdigest()
+        return STATE.reviewer_token
+
+    def _cookies(self):
+        # Cookie header parsed on first use and kept for the rest of the request.
+        # Pairs are located with str.find; the first occurrence of a name wins.
+        cookies = self._cookie_cache
+        if cookies is None:
+            cookies = {}
+            raw = self.headers.get("Cookie") or ""
+            i = 0
+            n = len(raw)
+            while i < n:
+                semi = raw.find(";", i)
+                end = n if semi == -1 else semi
+                eq = raw.find("=", i, end)
+                if eq != -1:
+                    k = raw[i:eq].strip()
+                    if k not in cookies:
+                        cookies[k] = raw[eq + 1 : end].rstrip()
+                i = end + 1
+            self._cookie_cache = cookies
+        return cookies
 
     def _get_cookie(self, name):
-        raw = self.headers.get("Cookie")
-        if not raw:
-            return None
-        parts = [p.strip() for p in raw.split(";")]
-        for p in parts:
-            if not p:
-                continue
-            if "=" in p:
-                k, v = p.split("=", 1)
-                if k.strip() == name:
-                    return v
-        return None
+        return self._cookies().get(name)
 
     def _set_reviewer_cookie(self, token):
         self.send_header("Set-Cookie", f"rev={token}; Path=/; HttpOnly; SameSite=Lax")
 
     def _require_reviewer(self):
         cookie = self._get_cookie("rev")
-        if cookie and cookie == self._reviewer_token():
+        if cookie and hmac.compare_digest(cookie.encode("utf-8"), STATE.reviewer_token_bytes):
             return True
         # Not authorized
-        self.send_response(HTTPStatus.UNAUTHORIZED)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(b'{"error":"unauthorized"}')
+        self.log_request(HTTPStatus.UNAUTHORIZED)
+        self.wfile.write(UNAUTHORIZED_RESPONSE)
+        self.close_connection = True
         return False
 
 
+class PooledHTTPServer(HTTPServer):
+    # Like ThreadingHTTPServer, but requests are handled by a set of long-lived
+    # worker threads instead of one new thread per connection. A worker is held
+    # only while a request is being served: between requests, keep-alive
+    # connections are parked in a selector and go back to the pool once the
+    # client sends something. Parked connections idle for longer than
+    # KEEPALIVE_TIMEOUT_SEC are closed.
+    # When every worker is busy (slow video readers, clients trickling a
+    # request in), the next ready connection gets a thread of its own, as
+    # ThreadingHTTPServer would do, so short API requests never queue behind them.
+    request_queue_size = 128  # listen() backlog; the default of 5 drops bursts
+
+    def __init__(self, server_address, handler_class, workers):
+        super().__init__(server_address, handler_class)
+        self._ready = queue.SimpleQueue()  # connections with a request to read
+        self._idle_workers = 0  # workers waiting on _ready and not yet handed a connection
+        self._idle_lock = threading.Lock()
+        self._to_park = queue.SimpleQueue()  # connections to wait on in the selector
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        threading.Thread(target=self._park_loop, name="http-keepalive", daemon=True).start()
+        for i in range(workers):
+            threading.Thread(target=self._worker_loop, name=f"http-worker-{i}", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        # Nothing read yet: wait in the selector like any idle connection.
+        self._park(self._open(request, client_address))
+
+    def _open(self, request, client_address):
+        # BaseRequestHandler.__init__ would serve the whole connection in one
+        # call; set the handler up by hand so it can outlive a single request
+        # (and keep rfile's buffer) while the connection is parked.
+        handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+        handler.request = request
+        handler.client_address = client_address
+        handler.server = self
+        handler.setup()
+        return handler
+
+    def _close(self, handler):
+        try:
+            handler.finish()
+        except Exception:
+            pass
+        self.shutdown_request(handler.request)
+
+    def _park(self, handler):
+        self._to_park.put(handler)
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass  # wake-up pipe full: the park loop is already due to run
+
+    def _park_loop(self):
+        # Only this thread touches the selector; other threads hand it
+        # connections through _to_park.
+        sel = selectors.DefaultSelector()
+        sel.register(self._wake_r, selectors.EVENT_READ)
+        deadlines = {}  # parked handler -> monotonic close time
+        while True:
+            timeout = max(0.0, min(deadlines.values()) - time.monotonic()) if deadlines else None
+            for key, _events in sel.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                handler = key.data
+                sel.unregister(key.fileobj)
+                del deadlines[handler]
+                self._dispatch(handler)
+            while True:
+                try:
+                    handler = self._to_park.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    sel.register(handler.connection, selectors.EVENT_READ, handler)
+                except (OSError, ValueError):
+                    self._close(handler)
+                    continue
+                deadlines[handler] = time.monotonic() + KEEPALIVE_TIMEOUT_SEC
+            now = time.monotonic()
+            for handler in [h for h, t in deadlines.items() if t <= now]:
+                sel.unregister(handler.connection)
+                del deadlines[handler]
+                self._close(handler)
+
+    def _dispatch(self, handler):
+        # Hand a ready connection to an idle worker, or to a new thread if
+        # there is none.
+        with self._idle_lock:
+            spare = self._idle_workers > 0
+            if spare:
+                self._idle_workers -= 1
+        if spare:
+            self._ready.put(handler)
+        else:
+            threading.Thread(target=self._serve_connection, args=(handler,), daemon=True).start()
+
+    def _worker_loop(self):
+        while True:
+            with self._idle_lock:
+                self._idle_workers += 1
+            self._serve_connection(self._ready.get())
+
+    def _serve_connection(self, handler):
+        try:
+            keep = self._serve_ready(handler)
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            keep = False
+        if keep:
+            self._park(handler)
+        else:
+            self._close(handler)
+
+    def _serve_ready(self, handler):
+        # Serve requests until the client closes or has nothing more buffered;
+        # True means the connection stays open and should be parked.
+        while True:
+            handler.close_connection = True
+            handler.handle_one_request()
+            if handler.close_connection:
+                return False
+            if not self._has_buffered_input(handler):
+                return True
+
+    @staticmethod
+    def _has_buffered_input(handler):
+        # A pipelined request may already sit in rfile's buffer, where the
+        # selector cannot see it. Peek without blocking.
+        sock = handler.connection
+        sock.settimeout(0.0)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(handler.timeout)
+
+
 def run():
     global STATE
     ensure_dirs()
@@ -822,8 +1401,10 @@ def run():
     except Exception:
         pass
     STATE = State()
+    # Turn SIGTERM into a normal exit so queued labels are flushed below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     addr = ("", PORT)
-    httpd = ThreadingHTTPServer(addr, Handler)
+    httpd = PooledHTTPServer(addr, Handler, HTTP_WORKERS)
     print(f"FastVideoLabel server running on http://localhost:{PORT}")
     print(f"Loading videos from: {VIDEOS_DIR}")
     print(f"Open: http://localhost:{PORT}/?user=alice")
@@ -833,6 +1414,8 @@ def run():
         pass
     finally:
         httpd.server_close()
+        if not STATE.flush():
+            print("Some labels could not be written to labels.jsonl", file=sys.stderr)
 
 
 if __name__ == "__main__":